@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
+import os
 import subprocess
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 MEDIA_DIR = Path("media")
 THUMB_DIR = Path("thumbnails")
-VIDEO_EXTENSIONS = [".mp4", ".mov", ".avi", ".mkv"]
+VIDEO_EXTENSIONS = frozenset({".mp4", ".mov", ".avi", ".mkv"})
 
 THUMB_DIR.mkdir(exist_ok=True)
 
@@ -17,9 +19,12 @@ def generate_thumbnail(video_path: Path, thumb_path: Path):
         cmd = [
             "ffmpeg",
             "-y",             # overwrite if exists
+            "-ss", "00:00:01",  # seek to 1 second (before -i: keyframe seek, no decoding up to it)
             "-i", str(video_path),
-            "-ss", "00:00:01",  # seek to 1 second
-            "-vframes", "1",    # capture 1 frame
+            "-frames:v", "1",   # capture 1 frame
+            "-an", "-sn", "-dn",  # skip audio, subtitle and data streams
+            "-q:v", "3",        # JPEG quality
+            "-threads", "1",    # parallelism comes from running several ffmpeg processes
             str(thumb_path)
         ]
         subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
@@ -28,13 +33,29 @@ def generate_thumbnail(video_path: Path, thumb_path: Path):
         print(f"Failed to generate thumbnail for {video_path.name}: {e}")
 
 def main():
-    for video_file in MEDIA_DIR.iterdir():
-        if video_file.suffix.lower() in VIDEO_EXTENSIONS:
+    with os.scandir(MEDIA_DIR) as it:
+        entries = [entry for entry in it if entry.is_file()]
+
+    videos, thumbs = [], []
+    for entry in entries:
+        if os.path.splitext(entry.name)[1].lower() in VIDEO_EXTENSIONS:
+            video_file = Path(entry.path)
             thumb_file = THUMB_DIR / f"{video_file.stem}.jpg"
             if not thumb_file.exists():
-                generate_thumbnail(video_file, thumb_file)
+                videos.append(video_file)
+                thumbs.append(thumb_file)
             else:
                 print(f"Thumbnail already exists: {thumb_file.name}")
 
+    # Each thumbnail is a separate ffmpeg process, so threads are enough to
+    # keep one running per core
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        try:
+            list(ex.map(generate_thumbnail, videos, thumbs))
+        except BaseException:
+            # Ctrl-C: don't start ffmpeg for the videos still queued
+            ex.shutdown(wait=False, cancel_futures=True)
+            raise
+
 if __name__ == "__main__":
     main()
@@ -1,17 +1,26 @@
 #!/usr/bin/env python3
+import os
 import json
 import sys
-import time
+import threading
 import argparse
 import calendar
 from pathlib import Path
+from typing import Iterator
 from datetime import datetime
-from collections import defaultdict
 from urllib.request import urlopen, Request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 MAX_RETRIES = 5
+DOWNLOAD_WORKERS = 16
 MEDIA_DIR_NAME = "media"
 FAILED_FILE = "failed.txt"
+_MONTH_NAMES = tuple(calendar.month_name)
 
 
 # -------------------- LOGGING --------------------
@@ -25,13 +34,19 @@ def log(msg):
 
 # -------------------- LOAD MEMORIES --------------------
 
-def load_memories(json_path: Path):
-    with json_path.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
+def iter_raw_memories(json_path: Path):
+    with json_path.open("rb") as f:
+        if ijson is None:
+            yield from json.load(f)
+        else:
+            # Stream records one at a time instead of loading the whole export
+            yield from ijson.items(f, "item")
+
 
+def load_memories(json_path: Path):
     memories = []
 
-    for item in raw:
+    for item in iter_raw_memories(json_path):
         try:
             date_str = item.get("Date") or item.get("Create Time") or item.get("Creation Time")
             filename = item.get("Filename") or item.get("File Name")
@@ -57,10 +72,42 @@ def load_memories(json_path: Path):
 
 # -------------------- DOWNLOAD --------------------
 
-def download_file(url, dest: Path):
+def download_file(url, dest: Path, stop: threading.Event):
     req = Request(url, headers={"User-Agent": "Mozilla/5.0"})
-    with urlopen(req, timeout=60) as r, dest.open("wb") as f:
-        f.write(r.read())
+    # Stream into a .part file and rename on success, so an interrupted
+    # download never leaves a truncated file that looks complete
+    tmp = dest.with_name(dest.name + ".part")
+    try:
+        with urlopen(req, timeout=60) as r, tmp.open("wb") as f:
+            # Copy in 256 KiB chunks so a Ctrl-C can abort mid-download
+            while chunk := r.read(1 << 18):
+                if stop.is_set():
+                    raise InterruptedError("download cancelled")
+                f.write(chunk)
+        os.replace(tmp, dest)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def download_with_retries(url, dest: Path, label, stop: threading.Event):
+    for attempt in range(1, MAX_RETRIES + 1):
+        if stop.is_set():
+            break
+        try:
+            log(f"{label} (attempt {attempt})")
+            download_file(url, dest, stop)
+            return True
+        except Exception as e:
+            log(f"  {label} retry failed: {e}")
+            stop.wait(1)
+    return False
+
+
+def save_failures(failed_path: Path, failures):
+    with failed_path.open("w", encoding="utf-8") as f:
+        for name, url in failures:
+            f.write(f"{name}|{url}\n")
 
 
 def download_media_files(memories, output_dir: Path, failed_only=False):
@@ -70,47 +117,69 @@ def download_media_files(memories, output_dir: Path, failed_only=False):
     failures = []
     downloaded = 0
 
-    failed_map = {}
-    if failed_only and Path(FAILED_FILE).exists():
-        with open(FAILED_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                name, url = line.strip().split("|", 1)
-                failed_map[name] = url
+    failed_path = Path(FAILED_FILE)
+
+    # Only names are needed: the URLs are taken from the memories themselves
+    failed_names = frozenset()
+    if failed_only and failed_path.exists():
+        with failed_path.open("r", encoding="utf-8") as f:
+            failed_names = frozenset(
+                line.split("|", 1)[0] for line in f if line.strip()
+            )
 
+    total = len(memories)
+    pending = []
+    queued = set()
     for idx, item in enumerate(memories, 1):
         filename = item["filename"]
         url = item["url"]
 
-        if failed_only and filename not in failed_map:
+        if failed_only and filename not in failed_names:
+            continue
+
+        # Two workers must never write the same file
+        if filename in queued:
             continue
 
         dest = media_dir / filename
         if dest.exists():
             continue
 
-        success = False
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                log(f"[{idx}/{len(memories)}] {filename} (attempt {attempt})")
-                download_file(url, dest)
-                downloaded += 1
-                success = True
-                break
-            except Exception as e:
-                log(f"  retry failed: {e}")
-                time.sleep(1)
-
-        if not success:
-            failures.append((filename, url))
+        queued.add(filename)
+        pending.append((f"[{idx}/{total}] {filename}", filename, url, dest))
+
+    # Downloads are network-bound, so threads overlap the waits
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+        futures = {
+            ex.submit(download_with_retries, url, dest, label, stop): (filename, url)
+            for label, filename, url, dest in pending
+        }
+        try:
+            for future in as_completed(futures):
+                if future.result():
+                    downloaded += 1
+                else:
+                    failures.append(futures[future])
+        except BaseException:
+            # Ctrl-C: drop queued downloads and stop retrying the running ones.
+            # Everything not downloaded yet stays in failed.txt for --failed-only
+            stop.set()
+            ex.shutdown(wait=False, cancel_futures=True)
+            unfinished = [
+                entry for future, entry in futures.items()
+                if not (future.done() and not future.cancelled()
+                        and future.exception() is None and future.result())
+            ]
+            if unfinished:
+                save_failures(failed_path, unfinished)
+            raise
 
     if failures:
-        with open(FAILED_FILE, "w", encoding="utf-8") as f:
-            for name, url in failures:
-                f.write(f"{name}|{url}\n")
+        save_failures(failed_path, failures)
         log(f"ERROR: {len(failures)} files failed after {MAX_RETRIES} retries")
     else:
-        if Path(FAILED_FILE).exists():
-            Path(FAILED_FILE).unlink()
+        failed_path.unlink(missing_ok=True)
         log("All files downloaded successfully")
 
     return downloaded
@@ -121,30 +190,26 @@ def download_media_files(memories, output_dir: Path, failed_only=False):
 def build_gallery_index(memories, media_dir: Path):
     items = []
 
+    # One directory read instead of a stat per memory
+    with os.scandir(media_dir) as it:
+        present = {entry.name for entry in it}
+
     for item in memories:
-        path = media_dir / item["filename"]
-        if not path.exists():
+        if item["filename"] not in present:
             continue
 
         items.append({
             "path": f"{MEDIA_DIR_NAME}/{item['filename']}",
-            "year": item["datetime"].year,
-            "month": item["datetime"].month,
-            "month_name": calendar.month_name[item["datetime"].month],
+            "datetime": item["datetime"],
             "is_video": "video" in item["media_type"]
         })
 
     return items
 
 
-def build_html(items):
-    grouped = defaultdict(lambda: defaultdict(list))
-    for i in items:
-        grouped[i["year"]][i["month"]].append(i)
-
-    years = sorted(grouped.keys(), reverse=True)
+# -------------------- HTML --------------------
 
-    html = """<!DOCTYPE html>
+HTML_HEAD = """<!DOCTYPE html>
 <html lang="en">
 <head>
 <meta charset="UTF-8">
@@ -171,27 +236,7 @@ img,video{width:100%;height:100%;object-fit:cover}
 </header>
 """
 
-    for year in years:
-        html += f'<section class="year" data-year="{year}"><h3>{year}</h3>'
-        for month in sorted(grouped[year].keys(), reverse=True):
-            items_m = grouped[year][month]
-            html += f'''
-<div class="month">
-  <div class="month-header" onclick="this.nextElementSibling.classList.toggle('hidden')">
-    <strong>{calendar.month_name[month]}</strong>
-    <span>{len(items_m)}</span>
-  </div>
-  <div class="grid">
-'''
-            for i in items_m:
-                if i["is_video"]:
-                    html += f'<div class="card"><video src="{i["path"]}" controls preload="metadata"></video></div>'
-                else:
-                    html += f'<div class="card"><img src="{i["path"]}" loading="lazy"></div>'
-            html += "</div></div>"
-        html += "</section>"
-
-    html += """
+HTML_TAIL = """
 <script>
 const years=document.querySelectorAll(".year");
 const sel=document.getElementById("yearFilter");
@@ -206,7 +251,42 @@ sel.onchange=()=>years.forEach(y=>{
 
 </body></html>
 """
-    return html
+
+
+def iter_html(items) -> Iterator[str]:
+    grouped = {}
+    for i in items:
+        dt = i["datetime"]
+        grouped.setdefault((dt.year, dt.month), []).append(i)
+
+    yield HTML_HEAD
+
+    year = None
+    for (y, month), items_m in sorted(grouped.items(), key=lambda kv: kv[0], reverse=True):
+        if y != year:
+            if year is not None:
+                yield "</section>"
+            year = y
+            yield f'<section class="year" data-year="{year}"><h3>{year}</h3>'
+        yield f'''
+<div class="month">
+  <div class="month-header" onclick="this.nextElementSibling.classList.toggle('hidden')">
+    <strong>{_MONTH_NAMES[month]}</strong>
+    <span>{len(items_m)}</span>
+  </div>
+  <div class="grid">
+'''
+        # f-strings beat str.format/format_map templates here; see gen_html.iter_html
+        for i in items_m:
+            if i["is_video"]:
+                yield f'<div class="card"><video src="{i["path"]}" controls preload="metadata"></video></div>'
+            else:
+                yield f'<div class="card"><img src="{i["path"]}" loading="lazy"></div>'
+        yield "</div></div>"
+    if year is not None:
+        yield "</section>"
+
+    yield HTML_TAIL
 
 
 # -------------------- MAIN --------------------
@@ -230,10 +310,19 @@ def main():
     download_media_files(memories, output_dir, args.failed_only)
 
     gallery_items = build_gallery_index(memories, media_dir)
-    html = build_html(gallery_items)
 
     output_path = output_dir / "memories_gallery.html"
-    output_path.write_text(html, encoding="utf-8")
+    # Write beside the target and swap it in, so a crash never leaves a
+    # half-written gallery behind
+    tmp_path = output_path.with_suffix(".html.part")
+    try:
+        with tmp_path.open("w", encoding="utf-8", buffering=1 << 20) as f:
+            for chunk in iter_html(gallery_items):
+                f.write(chunk)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
 
     log(f"Gallery generated at: {output_path.resolve()}")
     log(f"Media files indexed: {len(gallery_items)}")